@@ -1,14 +1,15 @@
 """
 Tools for the language server
 """
+import asyncio
+import concurrent.futures
 import time
 import os
 import sys
 import threading
-import socket
 import dataclasses
 import json
-from typing import Callable, List, Any, Union
+from typing import Callable, Dict, List, Any, Union
 from pygls.server import LanguageServer
 from lsprotocol.types import (
     Range,
@@ -30,6 +31,9 @@ from utils import bia
 
 router = socket_functions.universal_socket_router
 
+# Seconds to wait after the last change to a document before diagnosing it
+DIAGNOSTIC_DELAY = 0.15
+
 def block_print():
     """
     Redirects the sys.stdout to /dev/null to block print statements.
@@ -102,6 +106,9 @@ class LSPWrapper:
         self.most_recent_hovered_word = ""
         self.most_recent_hovered_line = ""
         self.last_closed = time.time()
+        self.pending_diagnostics: Dict[str, asyncio.TimerHandle] = {}
+        self.latest_document_versions: Dict[str, int] = {}
+        self.diagnostic_executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
     
     def add_diagnostic(self, function: Callable):
         """
@@ -133,30 +140,32 @@ class LSPWrapper:
         """
         self.functions.hover_functions.append(function)
 
-    def handle_connection(self, conn):
-        with conn:
-            data = conn.recv(1024).decode('utf-8')
+    async def handle_connection(self, reader, writer):
+        """
+        Answers a single socket request, running the router off the event loop
+        """
+        try:
+            data = await reader.read(1024)
             if self.socket_router:
-                response = self.socket_router.route_to(data)
-                if response:
-                    conn.sendall(response.encode('utf-8'))
-                else:
-                    conn.sendall("".encode('utf-8'))
+                response = await asyncio.to_thread(self.socket_router.route_to, data)
+                writer.write(response or b"")
+                await writer.drain()
+        finally:
+            writer.close()
+            await writer.wait_closed()
 
     def start_socket_server(self, host, port):
         """
         Starts socket server and kills any existing process on the given port.
         """
+        async def serve():
+            server = await asyncio.start_server(self.handle_connection, host, port, reuse_address=True)
+            async with server:
+                await server.serve_forever()
+
         def socket_server():
             try:
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                    s.bind((host, port))
-                    s.listen()
-                    while True:
-                        conn, _ = s.accept()
-                        thread = threading.Thread(target=self.handle_connection, args=(conn,))
-                        thread.start()
+                asyncio.run(serve())
             except OSError as e:
                 if e.errno == 98:  # Address already in use
                     print(f"Error: Port {port} is already in use. Another instance might be running.")
@@ -176,6 +185,8 @@ class LSPWrapper:
         )
         def actions(params: Union[Any, lsp_types.CodeActionParams]):
             items = []
+            if not self.functions.action_functions:
+                return items
             document_uri = params.text_document.uri
             document = self.server.workspace.get_document(document_uri)
             start_line = params.range.start.line
@@ -192,17 +203,41 @@ class LSPWrapper:
             return items
         self.high_level_functions.action_function = actions
 
-        @self.server.feature(lsp_types.TEXT_DOCUMENT_DID_CHANGE)
-        def diagnostics(params: lsp_types.DidChangeTextDocumentParams):
+        async def publish_diagnostics(params: lsp_types.DidChangeTextDocumentParams):
             document_uri = params.text_document.uri
+            # Run the diagnostic functions side by side, off the event loop so requests keep being answered
+            loop = asyncio.get_running_loop()
+            results = await asyncio.gather(*(
+                loop.run_in_executor(self.diagnostic_executor, diagnostic_function, self, params)
+                for diagnostic_function in self.functions.diagnostic_functions
+            ))
+            # A run for newer text may have finished first; don't overwrite its diagnostics with stale ranges
+            if params.text_document.version != self.latest_document_versions.get(document_uri):
+                return
             all_diagnostics = []
-            for diagnostic_function in self.functions.diagnostic_functions:
-                all_diagnostics.extend(diagnostic_function(self, params))
+            for diagnostics in results:
+                all_diagnostics.extend(diagnostics)
             error_diagnostics = [diagnostic for diagnostic in all_diagnostics if diagnostic.severity == DiagnosticSeverity.Error]
             if error_diagnostics:
                 self.server.publish_diagnostics(document_uri, error_diagnostics)
             else:
                 self.server.publish_diagnostics(document_uri, all_diagnostics)
+
+        def start_diagnostics(params: lsp_types.DidChangeTextDocumentParams):
+            self.pending_diagnostics.pop(params.text_document.uri, None)
+            self.server.loop.create_task(publish_diagnostics(params))
+
+        @self.server.feature(lsp_types.TEXT_DOCUMENT_DID_CHANGE)
+        def diagnostics(params: lsp_types.DidChangeTextDocumentParams):
+            # Only diagnose once typing pauses, instead of on every keystroke
+            document_uri = params.text_document.uri
+            self.latest_document_versions[document_uri] = params.text_document.version
+            pending = self.pending_diagnostics.pop(document_uri, None)
+            if pending is not None:
+                pending.cancel()
+            self.pending_diagnostics[document_uri] = self.server.loop.call_later(
+                DIAGNOSTIC_DELAY, start_diagnostics, params
+            )
         self.high_level_functions.diagnostic_function = diagnostics
 
         @self.server.feature(lsp_types.TEXT_DOCUMENT_COMPLETION, lsp_types.CompletionOptions(trigger_characters=["", " "]))
@@ -283,7 +318,7 @@ class LSPWrapper:
             f(text)
             
     def refresh_database(self):
-        self.socket_router.prepare(self.paths.raw_path, self)
+        self.socket_router.prepare(self.paths.raw_path, self, lazy=True)
 
     def initialize(self, lspw, params):
         """
@@ -1,13 +1,23 @@
 """
 Socket function router, functions, and logic
 """
+import functools
+import mmap
 import re
-import json
 import threading
+import orjson
 from utils import json_database
 from utils import bia
 from utils import editor
 
+MAX_CACHED_RESPONSES = 4096
+
+
+def dumps(obj) -> bytes:
+    """
+    Serializes a response for the socket, numpy scalars included
+    """
+    return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
 
 
 class SocketRouter:
@@ -22,102 +32,184 @@ class SocketRouter:
         return cls._instance
     
     def __init__(self):
+        if getattr(self, '_initialized', False):
+            return
         self.workspace_path = ""
-        self.database: json_database.JsonDatabase = None
+        self._database: json_database.JsonDatabase = None
+        self._database_stale = False
+        self._database_lock = threading.Lock()
         self.edit_results = []
         self.ready = False
         self.bia: bia.BidirectionalInverseAttention = None
         self.lspw = None
         self.statuses = {}
+        self.data_cache = {}
+        self._db_version = 0
+        cached = self._cached
+        self._dispatch = {
+            'verse_lad': self._h_verse_lad,
+            'search': cached(self._h_search),
+            'search_resources': cached(self._h_search_resources),
+            'get_most_similar': cached(self._h_get_most_similar),
+            'get_rarity': self._h_get_rarity,
+            'smart_edit': self._h_smart_edit,
+            'get_text': self._h_get_text,
+            'get_similar_drafts': cached(self._h_get_similar_drafts),
+            'detect_anomalies': cached(self._h_detect_anomalies),
+            'apply_edit': self._h_apply_edit,
+            'hover_word': self._h_hover_word,
+            'hover_line': self._h_hover_line,
+            'get_status': self._h_get_status,
+            'set_status': self._h_set_status,
+        }
+        self._initialized = True
 
-    def prepare(self, workspace_path, lspw):
-        """prepares the socket stuff"""
+    def prepare(self, workspace_path, lspw, lazy=False):
+        """
+        prepares the socket stuff
+
+        With lazy set, the database is only rebuilt when it is next read, so several edits in a row
+        cost a single rebuild
+        """
         self.workspace_path = workspace_path
-        try:
-            self.database: json_database.JsonDatabase = json_database.JsonDatabase()
-            self.database.create_database(bible_dir=self.workspace_path, codex_dir=self.workspace_path, resources_dir=self.workspace_path+'/.project/', save_all_path=self.workspace_path+"/.project/")
-            self.ready = True
-        except FileNotFoundError:
-            self.ready = False
         self.lspw = lspw
+        with self._database_lock:
+            self._database_stale = True
+        if not lazy:
+            self.build_database(save_draft=True)
+        self._db_version += 1
+        self.data_cache.clear()
 
-        
+    @property
+    def database(self) -> json_database.JsonDatabase:
+        """The database, rebuilt first if the workspace changed since it was built"""
+        if self._database_stale:
+            self.build_database()
+        return self._database
+
+    def build_database(self, save_draft=False):
+        """
+        Builds the database from the workspace, unless it is already up to date
+
+        The complete draft is only read when BIA is loaded at startup, so rebuilds after edits skip rewriting it
+        """
+        with self._database_lock:
+            if not self._database_stale:
+                return
+            try:
+                self._database = json_database.JsonDatabase()
+                self._database.create_database(bible_dir=self.workspace_path, codex_dir=self.workspace_path, resources_dir=self.workspace_path+'/.project/', save_all_path=self.workspace_path+"/.project/", save_draft=save_draft)
+                self.ready = True
+            except FileNotFoundError:
+                self.ready = False
+            self._database_stale = False
+
+    def _cached(self, handler):
+        """
+        Memoizes a read-only handler until the database is next rebuilt
+        """
+        def cached_handler(args):
+            key = (handler.__name__, orjson.dumps(args, option=orjson.OPT_SORT_KEYS))
+            version = self._db_version
+            hit = self.data_cache.get(key)
+            if hit is not None and hit[1] == version:
+                return hit[0]
+            response = handler(args)
+            if len(self.data_cache) >= MAX_CACHED_RESPONSES:
+                self.data_cache.clear()
+            self.data_cache[key] = (response, version)
+            return response
+        return cached_handler
 
     def route_to(self, json_input):
         """
         Routes a json query to the needed function
         """
 
-        data = json.loads(json_input)
+        data = orjson.loads(json_input)
         function_name = data['function_name']
         args = data['args']
 
-        if function_name == 'verse_lad':
-            result = self.verse_lad(args['query'], args['vref'])
-            return json.dumps({"score": result})
-
-        elif function_name == 'search':
-            results = self.search(args['text_type'], args['query'], args.get('limit', 10))
-            return json.dumps(results)
-
-        elif function_name == 'search_resources':
-            results = self.search_resources(args['query'], args.get('limit', 10))
-            return json.dumps(results)
-
-        elif function_name == 'get_most_similar':
-            results = self.get_most_similar(args['text_type'], args['text'])
-            return json.dumps([{'text': p[0], 'value': p[1]} for p in results])
-
-        elif function_name == 'get_rarity':
-            result = self.get_rarity(args['text_type'], args['text'])
-            return json.dumps({"rarity": result})
-        elif function_name == "smart_edit":
-            result = editor.get_edit(args['before'], args['after'], args['query'])
-            return json.dumps({'text': result})
-        elif function_name == 'get_text':
-            results = self.get_text(args['ref'], args['text_type'])
-            return json.dumps({"text": results})
-        elif function_name == 'get_similar_drafts':
-            results = self.database.get_similar_drafts(ref=args['ref'], top_n=args.get('limit', 5))
-            return json.dumps(results)
-        elif function_name == 'detect_anomalies':
-            results = self.detect_anomalies(args['query'], args.get('limit', 10))
-            return json.dumps(results)
-        
-        
-        elif function_name == 'apply_edit':
-            self.change_file(args['uri'], args['before'], args['after'])
-            self.lspw.refresh_database()
-            return json.dumps({'status': 'ok'})
-        
-        elif function_name == 'hover_word':
-            word = self.lspw.most_recent_hovered_word
-            return json.dumps({'word': word})
-        
-        elif function_name == "hover_line":
-            if self.lspw:
-                line = self.lspw.most_recent_hovered_line
-                return json.dumps({'line': line})
-            else:
-                return json.dumps({'line': ''})
-
-        elif function_name == "get_status":
-            key = args['key']
-            return json.dumps({'status': self.get_status(key)})
-        
-        elif function_name == "set_status":
-            key = args['key']
-            value = args['value']
-            self.set_status(key=key, value=value)
-            return json.dumps({'status': value})
-        else:
+        handler = self._dispatch.get(function_name)
+        if handler is None:
             raise ValueError(f"Unknown function: {function_name}")
+        return handler(args)
+
+    def _h_verse_lad(self, args):
+        result = self.verse_lad(args['query'], args['vref'])
+        return dumps({"score": result})
+
+    def _h_search(self, args):
+        results = self.search(args['text_type'], args['query'], args.get('limit', 10))
+        return dumps(results)
+
+    def _h_search_resources(self, args):
+        results = self.search_resources(args['query'], args.get('limit', 10))
+        return dumps(results)
+
+    def _h_get_most_similar(self, args):
+        results = self.get_most_similar(args['text_type'], args['text'])
+        return dumps([{'text': p[0], 'value': p[1]} for p in results])
+
+    def _h_get_rarity(self, args):
+        result = self.get_rarity(args['text_type'], args['text'])
+        return dumps({"rarity": result})
+
+    def _h_smart_edit(self, args):
+        result = editor.get_edit(args['before'], args['after'], args['query'])
+        return dumps({'text': result})
+
+    def _h_get_text(self, args):
+        results = self.get_text(args['ref'], args['text_type'])
+        return dumps({"text": results})
+
+    def _h_get_similar_drafts(self, args):
+        results = self.database.get_similar_drafts(ref=args['ref'], top_n=args.get('limit', 5))
+        return dumps(results)
+
+    def _h_detect_anomalies(self, args):
+        results = self.detect_anomalies(args['query'], args.get('limit', 10))
+        return dumps(results)
+
+    def _h_apply_edit(self, args):
+        self.change_file(args['uri'], args['before'], args['after'])
+        self.lspw.refresh_database()
+        return dumps({'status': 'ok'})
+
+    def _h_hover_word(self, args):
+        word = self.lspw.most_recent_hovered_word
+        return dumps({'word': word})
+
+    def _h_hover_line(self, args):
+        if self.lspw:
+            line = self.lspw.most_recent_hovered_line
+            return dumps({'line': line})
+        else:
+            return dumps({'line': ''})
+
+    def _h_get_status(self, args):
+        key = args['key']
+        return dumps({'status': self.get_status(key)})
+
+    def _h_set_status(self, args):
+        key = args['key']
+        value = args['value']
+        self.set_status(key=key, value=value)
+        return dumps({'status': value})
 
     def verse_lad(self, query, vref):
         """
         performs LAD on a verse
         """
-        return self.database.get_lad(query, vref=vref)
+        return self._cached_verse_lad(query, vref, self._db_version)
+
+    @functools.lru_cache(maxsize=4096)
+    def _cached_verse_lad(self, query, vref, version):
+        """
+        Memoizes verse_lad for a database version, so a result computed while the database
+        is rebuilt is never served for the new one
+        """
+        return self.database.get_lad(query, reference=vref)
 
     def search(self, text_type, query, limit=10):
         """Search the specified database for a query."""
@@ -135,21 +227,26 @@ class SocketRouter:
         return self.statuses.get(key, 'none')
     
     def set_status(self, key: str, value: str):
-        current = self.statuses.get(key, None)
-        if current:
-            self.statuses[key] = value
-        else:
-            self.statuses.update({key: value})
-        
+        self.statuses[key] = value
 
     def get_rarity(self, text_type, text):
         """
         tifidf rarity of some words
         """
+        return self._cached_rarity(text_type, text, self._db_version)
+
+    @functools.lru_cache(maxsize=4096)
+    def _cached_rarity(self, text_type, text, version):
+        """Memoizes get_rarity for a database version"""
         return self.database.word_rarity(text=text, text_type=text_type)
 
     def get_text(self, ref, text_type):
         """Retrieve text from the specified database based on book, chapter, and verse."""
+        return self._cached_text(ref, text_type, self._db_version)
+
+    @functools.lru_cache(maxsize=4096)
+    def _cached_text(self, ref, text_type, version):
+        """Memoizes get_text for a database version"""
         return self.database.get_text(ref=ref, text_type=text_type)
 
     def detect_anomalies(self, query, limit=100):
@@ -159,7 +256,7 @@ class SocketRouter:
         codex_results = self.database.search(query_text=query, text_type="target", top_n=limit)
         try:
             ref = codex_results[0]['ref']
-            source_query = self.database.get_text(ref=ref, text_type="source")
+            source_query = self.get_text(ref, "source")
             source_results = self.database.search(query_text=source_query, text_type="source", top_n=limit)
 
             return {
@@ -169,21 +266,40 @@ class SocketRouter:
         except IndexError:
             return {
                 "bible_results": self.database.search(query_text=query, text_type="source", top_n=limit),
-                "codex_results": self.database.search(query_text=query, text_type="target", top_n=limit)
+                "codex_results": codex_results
             }
     def change_file(self, uri, before, after):
+        """
+        Replaces `before` with `after` in a file, rewriting only from the first match onwards
+        """
         after = after.replace('"', '\\"')
-        with open(uri, 'r+', encoding='utf-8') as f:
-            text = f.read()
-            text = text.replace(before, after)
-            f.seek(0)
-            f.write(text)
+        if not before or before == after:
+            return
+        before_bytes = before.encode('utf-8')
+        after_bytes = after.encode('utf-8')
+        with open(uri, 'r+b') as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: # empty file
+                return
+            with mm:
+                offset = mm.find(before_bytes)
+                if offset == -1:
+                    return
+                end = offset + len(before_bytes)
+                tail = mm[end:]
+                if mm.find(before_bytes, end) != -1:
+                    tail = tail.replace(before_bytes, after_bytes)
+            f.seek(offset)
+            f.write(after_bytes)
+            f.write(tail)
             f.truncate()
+        json_database.forget_extracted_file(uri)
             
     def apply_edit(self,item, before, after):
         # soemthing that takes a while
         result = editor.get_edit(before, after, item['text'])
-        jsn = json.loads(result)
+        jsn = orjson.loads(result)
         result = {
             "reference": item['ref'],
             "uri": item['uri'],
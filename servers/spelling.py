@@ -1,131 +1,233 @@
 """
 Spelling
 """
+import base64
+import functools
+import heapq
 import json
 import os
+import pathlib
 import re
 import string
 import sys
+import threading
 import uuid
 from enum import Enum
-from typing import Dict, List, Tuple, Union
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 import numpy as np
+import orjson
 from PIL import Image, ImageDraw, ImageFont
 from pygls.server import LanguageServer
 from skimage.feature import hog
 from skimage.filters import threshold_sauvola
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import MinMaxScaler
 from lsprotocol.types import (CodeAction, CodeActionKind, CodeActionParams,
                               Command, CompletionItem, CompletionParams,
                               Diagnostic, DiagnosticSeverity, DocumentDiagnosticParams,
                               Position, Range, TextEdit, WorkspaceEdit)
 from utils import genetic_tokenizer
 
+try:
+    from rapidfuzz.distance import Levenshtein
+except ImportError:
+    Levenshtein = None  # distance() falls back to its own implementation
+
+# Data files shipped with the servers, found relative to this module rather than the working directory
+FILES_DIR = pathlib.Path(__file__).resolve().parent / "files"
+FONT_PATH = str(FILES_DIR / "unifont-15.1.04.otf")
+VERSE_DATA_PATH = str(FILES_DIR / "versedata.txt")
+
 class Hash:
     """
     Image hash
     """
-    def __init__(self, h: str):
-        self.h = [float(i) for i in h.split("::")]
+    def __init__(self, h: Union[str, np.ndarray]):
+        if isinstance(h, str):
+            h = h.split("::")
+        self.h = np.asarray(h, dtype=np.float32)
 
     def __sub__(self, other):
-        return sum(abs(float(a) - float(b)) for a, b in zip(self.h, other.h))
+        if self.h.shape != other.h.shape:
+            raise ValueError(f"Cannot compare hashes of shapes {self.h.shape} and {other.h.shape}")
+        return float(np.abs(self.h - other.h).sum())
 
     def __str__(self):
         return "::".join(str(a) for a in self.h)
 
+    def to_base64(self) -> str:
+        """
+        Encodes the hash as base64 float32 bytes, which is smaller and much faster to load than str()
+        """
+        return base64.b64encode(self.h.tobytes()).decode('ascii')
+
+    @classmethod
+    def from_base64(cls, encoded: str) -> 'Hash':
+        """
+        Decodes a hash made by to_base64. Raises ValueError if it is malformed.
+        """
+        return cls(np.frombuffer(base64.b64decode(encoded, validate=True), dtype=np.float32))
+
+def load_entry_hash(entry: Dict) -> Hash:
+    """
+    Loads the hash of a dictionary entry, preferring its binary form over the older string form.
+    Raises KeyError or ValueError if the entry has no usable hash.
+    """
+    if 'hash_b64' in entry:
+        try:
+            return Hash.from_base64(entry['hash_b64'])
+        except ValueError:
+            pass
+    return Hash(entry['hash'])
+
+def store_entry_hash(entry: Dict, entry_hash: Hash) -> None:
+    """
+    Stores a hash in a dictionary entry in both its string and binary forms.
+    """
+    entry['hash'] = str(entry_hash)
+    entry['hash_b64'] = entry_hash.to_base64()
+
 def divide_text_into_chunks(text, n):
     """
     divide into chunks
     """
-    chunk_size = max(1, len(text) // n)
+    chunk_size = max(1, -(-len(text) // n))
     chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
     chunks.extend([','] * (n - len(chunks)))
     return chunks
 
-def spell_hash(text: str, font_path: str = "servers/files/unifont-15.1.04.otf", font_size: int = 100) -> Hash:
+@functools.lru_cache(maxsize=8)
+def _get_font(font_path: str, font_size: int):
     """
-    Convert each letter in text to an image, extract visual features, and return it as a Hash object.
+    Loads a font once per path and size instead of parsing the font file for every chunk.
+    """
+    if font_path:
+        return ImageFont.truetype(font_path, font_size)
+    return ImageFont.load_default()
+
+@functools.lru_cache(maxsize=4096)
+def _glyph_features(chunk: str, font_path: str, font_size: int) -> Tuple[float, np.ndarray]:
+    """
+    Render a chunk of text and extract its normalized pixel count and HOG features.
+
+    Results are cached per chunk, so repeated substrings are only rendered once.
 
     Args:
-        text (str): The Unicode text to convert into an image.
-        font_path (str): Optional. Path to a .ttf font file. Uses default font if None.
+        chunk (str): The text to render.
+        font_path (str): Path to a .ttf font file. Uses default font if None.
         font_size (int): Font size.
 
     Returns:
-        Hash: A Hash object representing the visual features of the text.
+        Tuple[float, np.ndarray]: The normalized pixel count and the (read-only) HOG feature vector.
     """
-    text = divide_text_into_chunks(text, 3)
+    font = _get_font(font_path, font_size)
 
-    if font_path:
-        font = ImageFont.truetype(font_path, font_size)
-    else:
-        font = ImageFont.load_default()
+    img = Image.new('RGB', (font_size, font_size), color='white')
+    d = ImageDraw.Draw(img)
+    d.text((0, 0), chunk, fill='black', font=font)
 
-    pixel_counts = []
-    hog_features = []
+    letter_width = d.textlength(chunk, font=font)
 
-    for letter in text:
-        img = Image.new('RGB', (font_size, font_size), color='white')
-        d = ImageDraw.Draw(img)
-        d.text((0, 0), letter, fill='black', font=font)
+    grayscale_img = img.convert('L')
+    threshold = threshold_sauvola(np.array(grayscale_img), window_size=15, k=0.2)
+    binary_img = np.array(grayscale_img > threshold, dtype=np.uint8) * 255
 
-        letter_width = d.textlength(letter, font=font)
+    # The image is binary, so every pixel that is not white is black
+    white_pixels = np.count_nonzero(binary_img)
+    black_pixels = binary_img.size - white_pixels
 
-        grayscale_img = img.convert('L')
-        threshold = threshold_sauvola(np.array(grayscale_img), window_size=15, k=0.2)
-        binary_img = np.array(grayscale_img > threshold, dtype=np.uint8) * 255
+    # Zero width glyphs (e.g. combining marks) would otherwise divide by zero
+    normalized_count = (black_pixels - white_pixels) / max(letter_width, 1)
 
-        black_pixels = np.sum(binary_img == 0)
-        white_pixels = np.sum(binary_img == 255)
+    cell_size = max(1, font_size // 2)
+    hog_features = hog(binary_img, orientations=4, pixels_per_cell=(cell_size, cell_size), cells_per_block=(1, 1), block_norm='L2')
+    hog_features.flags.writeable = False
+    return float(normalized_count), hog_features
 
-        normalized_count = (black_pixels - white_pixels) / letter_width
-        pixel_counts.append(float(normalized_count))
+def spell_hash(text: str, font_path: str = FONT_PATH, font_size: int = 100) -> Hash:
+    """
+    Convert each letter in text to an image, extract visual features, and return it as a Hash object.
 
-        hog_features.append(hog(binary_img, orientations=4, pixels_per_cell=(10, 10), cells_per_block=(2, 2), block_norm='L2'))
+    Args:
+        text (str): The Unicode text to convert into an image.
+        font_path (str): Optional. Path to a .ttf font file. Uses default font if None.
+        font_size (int): Font size.
+
+    Returns:
+        Hash: A Hash object representing the visual features of the text.
+    """
+    glyphs = [_glyph_features(chunk, font_path, font_size) for chunk in divide_text_into_chunks(text, 3)]
+    pixel_counts = [count for count, _ in glyphs]
 
-    hog_features_flattened = np.array([feature.ravel() for feature in hog_features])
-    n_components = min(len(hog_features_flattened), hog_features_flattened.shape[1])
-    pca = PCA(n_components=n_components)
-    hog_features_reduced = pca.fit_transform(hog_features_flattened)
+    hog_vector = np.concatenate([features.ravel() for _, features in glyphs])
+    hog_vector = hog_vector / (np.linalg.norm(hog_vector) + 1e-9)
 
-    scaler = MinMaxScaler()
-    pixel_counts_scaled = scaler.fit_transform(np.array(pixel_counts).reshape(-1, 1)).flatten()
-    hog_features_scaled = scaler.fit_transform(hog_features_reduced)
+    pixel_counts = np.array(pixel_counts)
+    pixel_counts_scaled = (pixel_counts - pixel_counts.min()) / (pixel_counts.max() - pixel_counts.min() + 1e-9)
 
-    features = np.concatenate((pixel_counts_scaled, hog_features_scaled.ravel()))
+    features = np.concatenate((pixel_counts_scaled, hog_vector))
 
-    return Hash('::'.join(str(a) for a in features))
+    return Hash(features)
+
+def _bit_parallel_distance(pattern, text):
+    """
+    Myers' bit-parallel edit distance (Hyyro's formulation), with one bit per pattern character.
+    """
+    # Bitmask of the positions at which each character occurs in the pattern
+    peq: Dict[str, int] = {}
+    for i, char in enumerate(pattern):
+        peq[char] = peq.get(char, 0) | (1 << i)
+
+    mask = (1 << len(pattern)) - 1
+    last = 1 << (len(pattern) - 1)
+    vp, vn = mask, 0
+    score = len(pattern)
+
+    for char in text:
+        eq = peq.get(char, 0)
+        d0 = ((((eq & vp) + vp) ^ vp) | eq | vn) & mask
+        hp = (vn | ~(d0 | vp)) & mask
+        hn = vp & d0
+        if hp & last:
+            score += 1
+        elif hn & last:
+            score -= 1
+        hp = ((hp << 1) | 1) & mask
+        hn = (hn << 1) & mask
+        vp = (hn | ~(d0 | hp)) & mask
+        vn = hp & d0
+    return score
 
 def distance(str1, str2):
     """
     edit distance between two strings
     """
-    len_str1 = len(str1) + 1
-    len_str2 = len(str2) + 1
-
-    # Initialize a matrix to store the edit distances
-    matrix = [[0 for _ in range(len_str2)] for _ in range(len_str1)]
-
-    # Initialize the matrix with initial values
-    for i in range(len_str1):
-        matrix[i][0] = i
-    for j in range(len_str2):
-        matrix[0][j] = j
-
-    # Populate the matrix using dynamic programming
-    for i in range(1, len_str1):
-        for j in range(1, len_str2):
-            cost = 0 if str1[i - 1] == str2[j - 1] else 1
-            matrix[i][j] = min(
-                matrix[i - 1][j] + 1,      # Deletion
-                matrix[i][j - 1] + 1,      # Insertion
-                matrix[i - 1][j - 1] + cost  # Substitution
-            )
-
-    # The bottom-right cell contains the final edit distance
-    return matrix[-1][-1]
+    if Levenshtein is not None:
+        return Levenshtein.distance(str1, str2)
+
+    # The distance is symmetric, so only keep rows as long as the shorter string
+    if len(str1) < len(str2):
+        str1, str2 = str2, str1
+    if not str2:
+        return len(str1)
+
+    # Words fit in a single machine word, so all columns update at once
+    if len(str2) <= 64:
+        return _bit_parallel_distance(str2, str1)
+
+    # Only two rows of the dynamic programming matrix are ever needed
+    previous = list(range(len(str2) + 1))
+    for i, char1 in enumerate(str1, 1):
+        current = [i]
+        for j, char2 in enumerate(str2, 1):
+            cost = 0 if char1 == char2 else 1
+            current.append(min(
+                previous[j] + 1,         # Deletion
+                current[j - 1] + 1,      # Insertion
+                previous[j - 1] + cost   # Substitution
+            ))
+        previous = current
+
+    # The last cell of the final row contains the edit distance
+    return previous[-1]
 
 def block_print():
     """
@@ -142,7 +244,15 @@ def unblock_print():
 
 
 
-translator = str.maketrans('', '', string.punctuation)
+# string.punctuation is all ASCII, and ASCII bytes never appear inside a multi-byte UTF-8 character,
+# so the punctuation can be deleted from the encoded text byte by byte
+PUNCTUATION_BYTES = string.punctuation.encode('ascii')
+
+# Dictionary words further than this many edits away are never suggested
+MAX_SUGGESTION_DISTANCE = 3
+
+# Seconds to wait before writing the dictionary, so bursts of edits are saved once
+SAVE_DELAY = 0.5
 
 class CheckMode(Enum):
     """
@@ -153,64 +263,108 @@ class CheckMode(Enum):
     COMBINE_BOTH = 3
 
 def criteria(dictionary_word: Dict, word: str, word_hash: Hash,
-              dictionary, mode: CheckMode) -> Union[float, Tuple[float, float]]:
+              dictionary, mode: CheckMode) -> float:
     """
     Calculates the criteria for spell checking by comparing a word against a dictionary entry.
 
     If mode is EDIT_DISTANCE, it uses edit distance to determine the similarity between the word and the dictionary headWord.
     If mode is IMAGE_HASH, it uses image hash values to calculate the difference between the word and the dictionary entry.
-    If mode is COMBINE_BOTH, it returns a tuple containing the edit distance and hash difference.
+    COMBINE_BOTH is handled by SpellCheck.check, which reranks the closest words by edit distance with IMAGE_HASH.
 
     Parameters:
     dictionary_word (Dict): A dictionary entry with keys like 'hash' and 'headWord'.
     word (str): The word to compare against the dictionary entry.
+    word_hash (Hash): The image hash of the word.
     dictionary (Dictionary): The dictionary object.
     mode (CheckMode): The mode to use for spell checking.
 
     Returns:
-    Union[float, Tuple[float, float]]: The difference between the word and the dictionary entry as a float or a tuple of floats.
+    float: The difference between the word and the dictionary entry.
     """
     if mode == CheckMode.EDIT_DISTANCE:
         return distance(dictionary_word["headWord"], word)
     elif mode == CheckMode.IMAGE_HASH:
-        hash1 = Hash(dictionary_word['hash'])
-        hash2 = word_hash
-
-        # If an error occurs during hash comparison, rehash the older word and update the dictionary
-        rehashed_entry = {
-            **dictionary_word,
-            'hash': str(spell_hash(dictionary_word["headWord"]))
-        }
-        dictionary.dictionary['entries'] = [
-            rehashed_entry if entry['id'] == dictionary_word['id'] else entry
-            for entry in dictionary.dictionary['entries']
-        ]
-        dictionary.save_dictionary()
-        return Hash(rehashed_entry['hash']) - hash2
-    elif mode == CheckMode.COMBINE_BOTH:
-        edit_dist = distance(dictionary_word["headWord"], word)
-        hash1 = Hash(dictionary_word['hash'])
-        hash2 = word_hash
-        hash_diff = hash1 - hash2
-        # except Exception:
-        #     # If an error occurs during hash comparison, rehash the older word and update the dictionary
-        #     rehashed_entry = {
-        #         **dictionary_word,
-        #         'hash': str(spell_hash(dictionary_word["headWord"]))
-        #     }
-        #     dictionary.dictionary['entries'] = [
-        #         rehashed_entry if entry['id'] == dictionary_word['id'] else entry
-        #         for entry in dictionary.dictionary['entries']
-        #     ]
-        #     dictionary.save_dictionary()
-        #     hash_diff = Hash(rehashed_entry['hash']) - hash2
-        return (edit_dist, hash_diff)
+        try:
+            return load_entry_hash(dictionary_word) - word_hash
+        except (KeyError, ValueError):
+            # The stored hash is missing or was made by an older spell_hash, so rehash the word and update the dictionary
+            entry_hash = spell_hash(dictionary_word["headWord"])
+            store_entry_hash(dictionary_word, entry_hash)
+            dictionary.save_dictionary()
+            return entry_hash - word_hash
+    raise ValueError(f"Unsupported check mode for criteria: {mode}")
 
 def remove_punctuation(text: str) -> str:
     """
     Removes punctuation from the given text.
     """
-    return text.translate(translator).strip().replace(".", "").replace('"', '')
+    # '.' and '"' are deleted along with the rest of string.punctuation
+    encoded = text.encode('utf-8', 'surrogatepass')
+    return encoded.translate(None, PUNCTUATION_BYTES).decode('utf-8', 'surrogatepass').strip()
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree of words, indexed by edit distance
+    """
+    def __init__(self, words: Iterable[str] = ()) -> None:
+        """
+        Builds the tree from an iterable of words.
+
+        Args:
+            words (Iterable[str]): The words to index.
+        """
+        self.root: Optional[Tuple[str, Dict[int, tuple]]] = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str) -> None:
+        """
+        Inserts a word into the tree. Words already in the tree are ignored.
+
+        Args:
+            word (str): The word to insert.
+        """
+        if self.root is None:
+            self.root = (word, {})
+            return
+        node_word, children = self.root
+        while True:
+            edit_distance = distance(word, node_word)
+            if edit_distance == 0:
+                return
+            child = children.get(edit_distance)
+            if child is None:
+                children[edit_distance] = (word, {})
+                return
+            node_word, children = child
+
+    def query(self, word: str, max_distance: int) -> List[Tuple[str, int]]:
+        """
+        Finds every word in the tree within a given edit distance.
+
+        Args:
+            word (str): The word to look up.
+            max_distance (int): The largest edit distance to return.
+
+        Returns:
+            List[Tuple[str, int]]: The matching words and their edit distances, in no particular order.
+        """
+        results: List[Tuple[str, int]] = []
+        if self.root is None:
+            return results
+        stack = [self.root]
+        while stack:
+            node_word, children = stack.pop()
+            edit_distance = distance(word, node_word)
+            if edit_distance <= max_distance:
+                results.append((node_word, edit_distance))
+            # By the triangle inequality only these subtrees can hold matches
+            for child_distance in range(edit_distance - max_distance, edit_distance + max_distance + 1):
+                child = children.get(child_distance)
+                if child is not None:
+                    stack.append(child)
+        return results
 
 
 class Dictionary:
@@ -223,12 +377,75 @@ class Dictionary:
         """
         self.path = project_path + '/project.dictionary'  # TODO: #4 Use all .dictionary files in files directory
         self.dictionary = self.load_dictionary()  # Load the .dictionary (json file)
+        self._bk_tree: Optional[BKTree] = None
+        self._hash_matrix: Optional[np.ndarray] = None
+        self._save_timer: Optional[threading.Timer] = None
+        self._save_lock = threading.Lock()
+        self.headwords = {entry['headWord'].lower() for entry in self.dictionary['entries']}
+        self.entries_by_headword = self._index_entries()
+        self.version = 0  # Bumped whenever the entries change, so cached lookups can tell they are stale
         self.tokenizer = genetic_tokenizer.TokenDatabase(self.path, single_words=True, default_tokens=[entry for entry in self.dictionary['entries']])
         try:
             self.tokenizer.tokenizer.evolve([" ".join([entry['headWord'] for entry in self.dictionary["entries"]])])
         except ValueError:
             pass
-            
+
+    @property
+    def bk_tree(self) -> BKTree:
+        """
+        Edit distance index over the head words, built on first use.
+        """
+        if self._bk_tree is None:
+            self._bk_tree = BKTree(entry['headWord'] for entry in self.dictionary['entries'])
+        return self._bk_tree
+
+    def _index_entries(self) -> Dict[str, Dict]:
+        """
+        Maps each head word to its first entry.
+        """
+        entries_by_headword: Dict[str, Dict] = {}
+        for entry in self.dictionary['entries']:
+            entries_by_headword.setdefault(entry['headWord'], entry)
+        return entries_by_headword
+
+    def hash_matrix(self, size: int) -> np.ndarray:
+        """
+        Returns the image hashes of all entries as one float32 matrix, with rows in entry order.
+
+        Entries whose stored hash does not have the given size (e.g. ones saved by an older
+        version of spell_hash) are rehashed, entries without a binary hash get one, and the
+        dictionary is saved if anything changed.
+
+        Args:
+            size (int): The length of the current image hashes.
+
+        Returns:
+            np.ndarray: A (number of entries, size) matrix of hashes.
+        """
+        if self._hash_matrix is not None and self._hash_matrix.shape[1] == size:
+            return self._hash_matrix
+
+        rows = []
+        changed = False
+        for entry in self.dictionary['entries']:
+            try:
+                entry_hash = load_entry_hash(entry)
+            except (KeyError, ValueError):
+                entry_hash = None
+            if entry_hash is None or entry_hash.h.shape != (size,):
+                entry_hash = spell_hash(entry['headWord'])
+                store_entry_hash(entry, entry_hash)
+                changed = True
+            elif 'hash_b64' not in entry:
+                entry['hash_b64'] = entry_hash.to_base64()
+                changed = True
+            rows.append(entry_hash.h)
+        if changed:
+            self.save_dictionary()
+
+        self._hash_matrix = np.array(rows, dtype=np.float32).reshape(len(rows), size)
+        return self._hash_matrix
+
     def load_dictionary(self) -> Dict:
         """
         Loads the dictionary from a JSON file.
@@ -257,11 +474,29 @@ class Dictionary:
 
     def save_dictionary(self) -> None:
         """
-        Saves the current state of the dictionary to a JSON file.
+        Schedules the current state of the dictionary to be saved to its JSON file.
+
+        Saves requested within SAVE_DELAY seconds of each other are written together. Use sync() to write immediately.
         """
-        
-        with open(self.path, 'w', encoding="utf-8") as file:
-            json.dump(self.dictionary, file, indent=2)
+        with self._save_lock:
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(SAVE_DELAY, self.sync)
+                self._save_timer.start()
+
+    def sync(self) -> None:
+        """
+        Writes the dictionary to its JSON file now, cancelling any pending save.
+        """
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+
+            # Write to a temporary file first so the dictionary is never left half written
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'wb') as file:
+                file.write(orjson.dumps(self.dictionary, option=orjson.OPT_INDENT_2))
+            os.replace(temp_path, self.path)
 
     def define(self, word: str) -> None:
         """
@@ -273,11 +508,13 @@ class Dictionary:
         word = remove_punctuation(word)
         
         # Add a word if it does not already exist
-        if not any(entry['headWord'] == word for entry in self.dictionary['entries']) and word != '' and word != ' ':
+        if word not in self.entries_by_headword and word != '' and word != ' ':
+            word_hash = spell_hash(word)
             new_entry = {
                 'headWord': word, 
                 'id': str(uuid.uuid4()),
-                'hash': str(spell_hash(word)),
+                'hash': str(word_hash),
+                'hash_b64': word_hash.to_base64(),
                 'definition': '',
                 'translationEquivalents': [],
                 'links': [],
@@ -288,12 +525,17 @@ class Dictionary:
             }
             
             self.dictionary['entries'].append(new_entry)
+            if self._bk_tree is not None:
+                self._bk_tree.add(word)
+            self.headwords.add(word.lower())
+            self.entries_by_headword[word] = new_entry
+            self._hash_matrix = None
             self.save_dictionary()
         self.tokenizer.insert_manual([word])
-        text = ""
-        for entry in self.dictionary["entries"]:
-            text += entry['headWord']
-        self.tokenizer.upsert_text(text)
+        # New tokens change how words are split in diagnostics, even if the word was already defined
+        self.version += 1
+        # The tokenizer buffers everything it is given, so only hand it the new word
+        self.tokenizer.upsert_text(" " + word)
 
     def remove(self, word: str) -> None:
         """
@@ -305,6 +547,11 @@ class Dictionary:
         word = remove_punctuation(word)
         # Remove a word
         self.dictionary['entries'] = [entry for entry in self.dictionary['entries'] if entry['headWord'] != word]
+        self._bk_tree = None
+        self._hash_matrix = None
+        self.headwords = {entry['headWord'].lower() for entry in self.dictionary['entries']}
+        self.entries_by_headword = self._index_entries()
+        self.version += 1
         self.save_dictionary()
 
 
@@ -320,6 +567,8 @@ class SpellCheck:
         """
         self.dictionary = dictionary
         self.mode = mode
+        self._cached_check = functools.lru_cache(maxsize=8192)(self._check)
+        self._cached_complete = functools.lru_cache(maxsize=8192)(self._complete)
     
     def is_correction_needed(self, word: str) -> bool:
         """
@@ -336,9 +585,7 @@ class SpellCheck:
             return False
         word = word.lower()
         word = remove_punctuation(word)
-        return not any(
-            entry['headWord'].lower() == word for entry in self.dictionary.dictionary['entries']
-        )
+        return word not in self.dictionary.headwords
 
     def check(self, word: str) -> List[str]:
         """
@@ -351,39 +598,47 @@ class SpellCheck:
             List[str]: A list of suggested corrections, limited to the top 5 suggestions.
         """
         word = remove_punctuation(word).lower()
+        # Copy so callers can't modify the cached list
+        return list(self._cached_check(word, self.mode, self.dictionary.version))
 
+    def _check(self, word: str, mode: CheckMode, version: int) -> List[str]:
+        """
+        Computes the suggestions for check(). The mode and dictionary version are
+        only part of the cache key.
+        """
         if not self.is_correction_needed(word):
             return [word]  # No correction needed, return the original word
 
         entries = self.dictionary.dictionary['entries']
-        word_hash = spell_hash(word)
-
-        if self.mode == CheckMode.COMBINE_BOTH:
-            # Find top n words using edit distance
-            top_n = 10
-            edit_distance_possibilities = [
-                (entry['headWord'], distance(entry['headWord'], word))
-                for entry in entries
-            ]
-            sorted_by_edit_distance = sorted(edit_distance_possibilities, key=lambda x: x[1])
-            top_words = sorted_by_edit_distance[:top_n]
-
-            # Rerank top words using hashing
-            hash_possibilities = [
-                (word, criteria(next(entry for entry in entries if entry['headWord'] == word), word, word_hash, self.dictionary, CheckMode.IMAGE_HASH))
-                for word, _ in top_words
-            ]
-            sorted_by_hash = sorted(hash_possibilities, key=lambda x: x[1])
-            suggestions = [word for word, _ in sorted_by_hash]
+
+        if mode == CheckMode.IMAGE_HASH:
+            word_hash = spell_hash(word).h
+            hash_matrix = self.dictionary.hash_matrix(len(word_hash))
+            # L1 distance to every entry at once
+            hash_distances = np.abs(hash_matrix - word_hash).sum(axis=1)
+            top_n = min(5, len(hash_distances))
+            if top_n == 0:
+                return []
+            best = np.argpartition(hash_distances, top_n - 1)[:top_n]
+            best = best[np.argsort(hash_distances[best], kind='stable')]
+            suggestions = [entries[i]['headWord'] for i in best]
         else:
-            possibilities = [
-                (entry['headWord'], criteria(entry, word, word_hash, self.dictionary, self.mode))
-                for entry in entries
-            ]
-            sorted_possibilities = sorted(possibilities, key=lambda x: x[1])
-            suggestions = [word for word, _ in sorted_possibilities]
-
-        suggestions = suggestions[:5]
+            # Only head words within a few edits can be suggested, so let the index prune the rest
+            edit_distance_possibilities = self.dictionary.bk_tree.query(word, MAX_SUGGESTION_DISTANCE)
+
+            if mode == CheckMode.COMBINE_BOTH:
+                # Rerank top n words using hashing
+                top_n = 10
+                top_words = heapq.nsmallest(top_n, edit_distance_possibilities, key=lambda x: x[1])
+                word_hash = spell_hash(word)
+                hash_possibilities = [
+                    (word, criteria(self.dictionary.entries_by_headword[word], word, word_hash, self.dictionary, CheckMode.IMAGE_HASH))
+                    for word, _ in top_words
+                ]
+                suggestions = [word for word, _ in heapq.nsmallest(5, hash_possibilities, key=lambda x: x[1])]
+            else:
+                suggestions = [word for word, _ in heapq.nsmallest(5, edit_distance_possibilities, key=lambda x: x[1])]
+
         return suggestions
     
     def complete(self, word: str) -> List[str]:
@@ -397,7 +652,13 @@ class SpellCheck:
             List[str]: A list of word portions that complete the given word fragment, limited to the top 5 suggestions.
         """
         word = remove_punctuation(word).lower()
+        # Copy so callers can't modify the cached list
+        return list(self._cached_complete(word, self.dictionary.version))
 
+    def _complete(self, word: str, version: int) -> List[str]:
+        """
+        Computes the completions for complete(). The dictionary version is only part of the cache key.
+        """
         entries = self.dictionary.dictionary['entries']
         completions = [
             entry['headWord'][len(word):] for entry in entries if entry['headWord'].lower().startswith(word)
@@ -406,27 +667,33 @@ class SpellCheck:
         # Sort completions based on their length to prioritize shorter, more likely completions
         sorted_completions = sorted(completions, key=lambda x: len(x))
         return sorted_completions[:5]
-def vfilter(text, reference):
-    # Define a regular expression pattern to find verse references
-    pattern = r'\b([A-Z]+)\s+(\d+):(\d+)\b'
 
-    # Define a function to replace each match with underscores
-    def replace_with_underscores(match):
-        book, chapter, verse = match.groups()
-        book_underscores = "_" * len(book)
-        chapter_underscores = "_" * len(chapter)
-        verse_underscores = "_" * len(verse)
-        return f"{book_underscores} {chapter_underscores}:{verse_underscores}"
+# Runs of non-whitespace, i.e. the words of a line
+WORD_PATTERN = re.compile(r'\S+')
 
-    # Use re.sub to replace each match with underscores
-    filtered_text = re.sub(pattern, replace_with_underscores, text)
+# Verse references such as "GEN 1:1"
+VERSE_REFERENCE_PATTERN = re.compile(r'\b([A-Z]+)\s+(\d+):(\d+)\b')
+
+def _replace_with_underscores(match):
+    """
+    Replaces each part of a verse reference with underscores of the same length
+    """
+    book, chapter, verse = match.groups()
+    book_underscores = "_" * len(book)
+    chapter_underscores = "_" * len(chapter)
+    verse_underscores = "_" * len(verse)
+    return f"{book_underscores} {chapter_underscores}:{verse_underscores}"
+
+def vfilter(text):
+    # Replace each verse reference with underscores
+    filtered_text = VERSE_REFERENCE_PATTERN.sub(_replace_with_underscores, text)
 
     return filtered_text
-def get_verse_references_from_file(path):
+
+def get_verse_references_from_file(path=VERSE_DATA_PATH):
     """
     get verse references
     """
-    path = 'servers/files/versedata.txt'
     with open(path, 'r', encoding='utf-8') as f:
         return f.readlines()
 
@@ -463,9 +730,6 @@ def extract_book_names(file_path):
     return book_names
 
 
-
-references = get_verse_references_from_file('src/utils/verseRefUtils/verseData.ts')
-
 class SPELLING_MESSAGE(Enum):
     """
     Spelling error messages 
@@ -492,6 +756,9 @@ class ServableSpelling:
         self.spell_check: SpellCheck = None
         self.lspw = lspw
         self.lspw.functions.initialize_functions.append(self.initialize)
+        self._cached_typo_message = functools.lru_cache(maxsize=8192)(self._typo_message)
+        # Most edits touch one line, so the diagnostics of every other line can be reused
+        self._cached_line_diagnostics = functools.lru_cache(maxsize=16384)(self._diagnose_line)
 
     def spell_completion(self, lspw, params: CompletionParams, _range: Range) -> List:
         """
@@ -539,31 +806,45 @@ class ServableSpelling:
         #if ".codex" in document_uri or ".scripture" in document_uri:
         document = lspw.server.workspace.get_document(document_uri)
         lines = document.lines
+        if self.spell_check is None:
+            return diagnostics
+        version = self.spell_check.dictionary.version
         for line_num, line in enumerate(lines):
-            if len(line) % 5 == 0:
-                line = vfilter(line, references)
-            words = line.split(" ")
-            edit_window = 0
-
-            for word in words:
-                if self.spell_check and self.spell_check.is_correction_needed(word):
-                    start_char = edit_window
-                    end_char = start_char + len(word)
-                    
-                    _range = Range(start=Position(line=line_num, character=start_char),
-                                end=Position(line=line_num, character=end_char))
-                    
-                    tokenized_word = self.spell_check.dictionary.tokenizer.tokenize(word)
-                    detokenized_word = self.spell_check.dictionary.tokenizer.tokenizer.detokenize(tokenized_word, join="-")
-                    formatted_message = SPELLING_MESSAGE.TYPO.value.format(word=detokenized_word)
-
-                    diagnostics.append(Diagnostic(range=_range, message=formatted_message, severity=DiagnosticSeverity.Information, source='Spell-Check'))
-                # Add one if the next character is whitespace
-                if edit_window + len(word) < len(line) and line[edit_window + len(word)] == ' ':
-                    edit_window += len(word) + 1
-                else:
-                    edit_window += len(word)
+            diagnostics.extend(self._cached_line_diagnostics(line_num, line, version))
         return diagnostics
+
+    def _diagnose_line(self, line_num: int, line: str, version: int) -> List[Diagnostic]:
+        """
+        Generate diagnostics for the spelling errors in one line of a document.
+
+        Args:
+            line_num (int): The line number of the line.
+            line (str): The text of the line.
+            version (int): The dictionary version, only used as part of the cache key.
+
+        Returns:
+            List[Diagnostic]: A list of Diagnostic objects representing spelling errors.
+        """
+        diagnostics: List[Diagnostic] = []
+        if len(line) % 5 == 0:
+            line = vfilter(line)
+        for match in WORD_PATTERN.finditer(line):
+            word = match.group()
+            if self.spell_check and self.spell_check.is_correction_needed(word):
+                _range = Range(start=Position(line=line_num, character=match.start()),
+                            end=Position(line=line_num, character=match.end()))
+                formatted_message = self._cached_typo_message(word, version)
+                diagnostics.append(Diagnostic(range=_range, message=formatted_message, severity=DiagnosticSeverity.Information, source='Spell-Check'))
+        return diagnostics
+
+    def _typo_message(self, word: str, version: int) -> str:
+        """
+        Formats the typo message for a word, showing how the tokenizer splits it.
+        The dictionary version is only part of the cache key.
+        """
+        tokenized_word = self.spell_check.dictionary.tokenizer.tokenize(word)
+        detokenized_word = self.spell_check.dictionary.tokenizer.tokenizer.detokenize(tokenized_word, join="-")
+        return SPELLING_MESSAGE.TYPO.value.format(word=detokenized_word)
     
     def spell_action(self, lspw, params: CodeActionParams, _range: Range) -> List[CodeAction]:
         """
@@ -663,4 +944,6 @@ class ServableSpelling:
         """
         self.dictionary = Dictionary(self.lspw.paths.raw_path + "/.project/")
         self.spell_check = SpellCheck(dictionary=self.dictionary)
+        self._cached_typo_message.cache_clear()
+        self._cached_line_diagnostics.cache_clear()
         return params, None, lspw # get rid of pylint stuff
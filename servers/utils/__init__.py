@@ -7,7 +7,8 @@ from . import genetic_tokenizer
 from . import verse_validator
 from . import json_database
 from . import verses
+from . import documents
 from . import servable_wb
 
 __all__ = ["bia", "genetic_tokenizer", "install_packages", "json_database", 
-           "verses", "verse_validator", "servable_wb"]
+           "verses", "verse_validator", "servable_wb", "documents"]
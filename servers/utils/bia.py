@@ -9,6 +9,10 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 import numpy as np
 from scipy.sparse import csr_matrix
 
+# Whitespace after the end of a sentence, skipping abbreviations like "e.g." and "Mr."
+SENTENCE_BOUNDARY_PATTERN = re.compile(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?)\s')
+PUNCTUATION_PATTERN = re.compile(r'[^\w\s]')
+
 
 class MarkovChain:
     """
@@ -99,8 +103,8 @@ class BidirectionalInverseAttention:
         """
         with open(path, 'r', encoding='utf-8') as f:
             corpus = f.read().lower()
-            sentences = re.split(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?)\s', corpus)
-            sentences = [re.sub(r'[^\w\s]', '', sentence) for sentence in sentences]
+            sentences = SENTENCE_BOUNDARY_PATTERN.split(corpus)
+            sentences = [PUNCTUATION_PATTERN.sub('', sentence) for sentence in sentences]
         self.corpus = corpus
         self.chain = MarkovChain(corpus)
         self.sentences = sentences
@@ -128,7 +132,7 @@ class BidirectionalInverseAttention:
             list: A list of sentences relevant to the query.
         """
         # Transform the query into a TF-IDF vector
-        query_vector = self.vectorizer.transform([re.sub(r'\[MASK\]', '', query)])
+        query_vector = self.vectorizer.transform([query.replace('[MASK]', '')])
 
         # Compute the similarity scores between the query vector and the sentence vectors
         similarity_scores = self.tfidf_matrix.dot(query_vector.T).toarray().flatten()
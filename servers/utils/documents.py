@@ -0,0 +1,19 @@
+"""
+Tells which workspace documents hold scripture
+"""
+
+# Documents that hold scripture; notebook cell URIs add a #fragment after the file name
+CODEX_SUFFIXES = (".codex", ".scripture")
+
+
+def is_scripture_uri(uri: str) -> bool:
+    """
+    Checks whether a document URI points at a scripture file, ignoring any notebook cell fragment.
+
+    Args:
+        uri (str): The URI of the document.
+
+    Returns:
+        bool: True if the document is a .codex or .scripture file.
+    """
+    return uri.partition("#")[0].endswith(CODEX_SUFFIXES)
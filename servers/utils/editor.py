@@ -1,4 +1,4 @@
-from openai import OpenAI
+import functools
 
 
 
@@ -15,10 +15,16 @@ New text to edit:
 Output only the edited text, with no additional commentary.
 """
 
-client = OpenAI(api_key="")
+@functools.cache
+def get_client():
+    """
+    Creates the OpenAI client on first use, so importing this module stays cheap
+    """
+    from openai import OpenAI
+    return OpenAI(api_key="")
 
 def get_edit(before, after, text):
-    completion = client.chat.completions.create(
+    completion = get_client().chat.completions.create(
         model="gpt-4o",
         messages=[
             {"role": "system", "content": system.format(before=before, after=after)},
@@ -2,6 +2,9 @@ from genetok import tokenizer
 from typing import List
 import sys, os, re
 
+PUNCTUATION_PATTERN = re.compile(r'[^\w\s]')
+# Turns newlines and tabs into spaces
+SPACES_TABLE = str.maketrans('\n\t', '  ')
 
 def split(string, n):
     return [string[i:i+n] for i in range(0, len(string), n)]
@@ -86,7 +89,7 @@ class TokenDatabase:
             text (str): The text to add to the buffer.
         """
         # Remove punctuation, convert to lowercase, remove newlines and tabs
-        text = re.sub(r'[^\w\s]', '', text.lower().replace('\n', ' ').replace('\t', ' '))
+        text = PUNCTUATION_PATTERN.sub('', text.lower().translate(SPACES_TABLE))
         self.text += text
     
     def upsert_all(self):
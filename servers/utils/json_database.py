@@ -1,10 +1,24 @@
+import concurrent.futures
 import os
 import re
-import json
 from difflib import SequenceMatcher
+import numpy as np
+import orjson
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 
+# A verse reference such as "GEN 1:1"
+REFERENCE_PATTERN = re.compile(r'\w+\s+\d+:\d+')
+# A verse reference in a .bible file and the whitespace before its text
+BIBLE_VERSE_START_PATTERN = re.compile(r'(\w+\s+\d+:\d+)\s+')
+# The whitespace and reference that end a verse's text
+BIBLE_VERSE_END_PATTERN = re.compile(r'\s+\w+\s+\d+:\d+')
+
+# Verses already extracted from each .codex and .bible file, with the modification time and size they were read at
+_extracted_files = {}
+# Number of .codex files read at once when building the database
+EXTRACT_WORKERS = 8
+
 
 def similarity(first, second):
     """
@@ -20,6 +34,23 @@ def similarity(first, second):
     score = SequenceMatcher(None, first, second).ratio() * 100
     return int(score)
 
+def best_indices(similarities, top_n):
+    """
+    Selects the indices of the highest scores in a single-row similarity matrix.
+
+    Args:
+        similarities (np.ndarray): A 1 x n matrix of similarity scores.
+        top_n (int): The number of indices to return.
+
+    Returns:
+        np.ndarray: The indices of the top_n scores, best first.
+    """
+    scores = similarities[0]
+    if top_n <= 0 or top_n >= len(scores):
+        return scores.argsort()[-top_n:][::-1]
+    top = np.argpartition(scores, -top_n)[-top_n:]
+    return top[np.argsort(scores[top])[::-1]]
+
 class JsonDatabase:
     """
     A class to manage a JSON-based database for storing and retrieving text data,
@@ -43,12 +74,13 @@ class JsonDatabase:
         self.resource_texts = []
         self.source_references = []
         self.target_references = []
+        self.target_index = {}
         self.source_uris = []
         self.target_uris = []
         self.resource_uris = []
         self.complete_draft = ""
     
-    def create_database(self, bible_dir, codex_dir, resources_dir, save_all_path):
+    def create_database(self, bible_dir, codex_dir, resources_dir, save_all_path, save_draft=True):
         """
         Populates the database with texts from bible files, codex chunks, and resources,
         and generates TF-IDF matrices for source, target, and resource texts.
@@ -58,12 +90,16 @@ class JsonDatabase:
             codex_dir (str): Directory containing codex files.
             resources_dir (str): Directory containing resource files.
             save_all_path (str): Path to save the complete draft of texts.
+            save_draft (bool): Whether to write the complete draft to save_all_path.
         """
         try:
             source_files = extract_from_bible_file(path=find_all(bible_dir, ".bible")[0])
         except IndexError:
+            _forget_extracted_files(".bible", set())
             source_files = []
         target_files = extract_codex_chunks(path=codex_dir)
+        # Repeated += on an attribute copies the whole draft each time, so collect the texts and join once
+        draft_texts = []
 
     
 
@@ -78,10 +114,11 @@ class JsonDatabase:
                 if len(text) < 4:
                     continue
                 self.dictionary[ref] = {"target": text, "target_uri": uri}
+            self.target_index.setdefault(ref, len(self.target_references))
             self.target_texts.append(text)
             self.target_references.append(ref)
             self.target_uris.append(uri)
-            self.complete_draft += " " + text
+            draft_texts.append(text)
     
         for verse in source_files:
             ref = verse["ref"]
@@ -95,8 +132,9 @@ class JsonDatabase:
             self.source_references.append(ref)
             self.source_uris.append(uri)
 
-        with open(save_all_path+"/complete_draft.context", "w+", encoding='utf-8') as f:
-            f.write(self.complete_draft)
+        self.complete_draft = "".join(" " + text for text in draft_texts)
+        if save_draft:
+            self.save_draft(save_all_path)
         
         if self.source_texts:
             try:
@@ -114,6 +152,16 @@ class JsonDatabase:
         
 
     
+    def save_draft(self, save_all_path):
+        """
+        Writes the complete draft of target texts to complete_draft.context.
+
+        Args:
+            save_all_path (str): Directory to write the draft to.
+        """
+        with open(save_all_path+"/complete_draft.context", "w+", encoding='utf-8') as f:
+            f.write(self.complete_draft)
+
     def search(self, query_text, text_type="source", top_n=5):
         """
         Searches for texts that are most similar to the query text within the specified text type,
@@ -132,7 +180,7 @@ class JsonDatabase:
                 return [{'ref': ref, 'text': '', 'uri': uri} for ref, uri in zip(self.source_references, self.source_uris) if ref in self.dictionary][:top_n]
             query_vector = self.tfidf_vectorizer_source.transform([query_text])
             similarities = cosine_similarity(query_vector, self.tfidf_matrix_source)
-            top_indices = similarities.argsort()[0][-top_n:][::-1]
+            top_indices = best_indices(similarities, top_n)
             ret = [{'ref': self.source_references[i], 'text': self.source_texts[i], 'uri': self.source_uris[i]} for i in top_indices if self.source_references[i] in self.dictionary]
             return ret
         elif text_type == "target":
@@ -141,7 +189,7 @@ class JsonDatabase:
                 return [{'ref': ref, 'text': '', 'uri': uri} for ref, uri in zip(self.target_references, self.target_uris)][:top_n]
             query_vector = self.tfidf_vectorizer_target.transform([query_text])
             similarities = cosine_similarity(query_vector, self.tfidf_matrix_target)
-            top_indices = similarities.argsort()[0][-top_n:][::-1]
+            top_indices = best_indices(similarities, top_n)
 
             ret =  [{'ref': self.target_references[i], 'text': self.target_texts[i], 'uri': self.target_uris[i]} for i in top_indices]
             return ret
@@ -276,7 +324,7 @@ class JsonDatabase:
             return [{'uri': uri, 'text': ''} for uri in self.resource_uris][:top_n]
         query_vector = self.tfidf_vectorizer_resources.transform([query_text])
         similarities = cosine_similarity(query_vector, self.tfidf_matrix_resources)
-        top_indices = similarities.argsort()[0][-top_n:][::-1]
+        top_indices = best_indices(similarities, top_n)
         return [{'uri': self.resource_uris[i], 'text': self.resource_texts[i]} for i in top_indices]
     
     def get_text(self, ref: str, text_type="source"):
@@ -291,13 +339,11 @@ class JsonDatabase:
             str: The text associated with the given reference and text type, or an empty string if not found.
         """
         if text_type == "target":
-            try:
-                # Search for the reference in self.target_references
-                index = self.target_references.index(ref)
-                return self.target_texts[index]
-            except ValueError:
+            # Look the reference up by position rather than scanning self.target_references
+            index = self.target_index.get(ref)
+            if index is None:
                 return ''
-       # Return empty string if reference not found
+            return self.target_texts[index]
             
         if ref in self.dictionary and text_type in self.dictionary[ref]:
             return self.dictionary[ref][text_type]
@@ -353,40 +399,22 @@ def get_data(data, path):
     for cell in data['cells']:
         if cell['kind'] == 2:  # Scripture cell
             scripture_text = cell['value']
-            # Find all the references in the scripture text
-            references = re.findall(r'\w+\s+\d+:\d+', scripture_text)
-            # Process each reference
-            for i in range(len(references) - 1):
-                ref = references[i]
-                next_ref = references[i + 1]
-                # Find the text between the current reference and the next reference
-                pattern = re.escape(ref) + r'(.*?)' + re.escape(next_ref)
-                match = re.search(pattern, scripture_text, re.DOTALL)
-                if match:
-                    text = match.group(1).strip()
-                    # Create a dictionary for the verse
-                    if len(text) < 4:
-                        continue
-                    verse = {
-                        'ref': ref,
-                        'text': text,
-                        'uri': path
-                    }
-                    # Add the verse to the list
-                    verses.append(verse)
-            # Handle the last reference
-            last_ref = references[-1]
-            pattern = re.escape(last_ref) + r'(.*)'
-            match = re.search(pattern, scripture_text, re.DOTALL)
-            if match:
-                text = match.group(1).strip()
-                # Create a dictionary for the last verse
+            # Find all the references in the scripture text in one pass
+            references = list(REFERENCE_PATTERN.finditer(scripture_text))
+            for i, reference in enumerate(references):
+                is_last = i == len(references) - 1
+                # The text runs from the end of this reference to the start of the next one
+                end = len(scripture_text) if is_last else references[i + 1].start()
+                text = scripture_text[reference.end():end].strip()
+                if not is_last and len(text) < 4:
+                    continue
+                # Create a dictionary for the verse
                 verse = {
-                    'ref': last_ref,
+                    'ref': reference.group(),
                     'text': text,
-                    'uri': path,
+                    'uri': path
                 }
-                # Add the last verse to the list
+                # Add the verse to the list
                 verses.append(verse)
     return verses
 
@@ -400,10 +428,65 @@ def extract_from_file(path):
     Returns:
         list: A list of verse data extracted and formatted from the file.
     """
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    return _cached_extract(path, _extract_codex_verses)
+
+def _extract_codex_verses(path):
+    """
+    Reads and formats the verses of a .codex file, without caching.
+    """
+    with open(path, "rb") as f:
+        data = orjson.loads(f.read())
     return get_data(data, path)
 
+def _cached_extract(path, extract):
+    """
+    Extracts the verses of a file, reusing the last result while the file's modification time and size are unchanged.
+
+    Args:
+        path (str): The path to the file.
+        extract (Callable): Reads the verses from the file at a path.
+
+    Returns:
+        list: The verses extracted from the file.
+    """
+    # Rebuilding the database re-reads every file, so reuse the verses of files that have not changed
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _extracted_files.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    verses = extract(path)
+    _extracted_files[path] = (version, verses)
+    return verses
+
+def forget_extracted_file(path):
+    """
+    Drops the cached verses of a file that was just rewritten. An edit of the same length that lands
+    within the filesystem's timestamp resolution leaves the modification time and size unchanged, so the
+    cache cannot notice it by itself.
+
+    Args:
+        path (str): The path to the rewritten file.
+    """
+    path = os.path.normpath(path)
+    for cached_path in list(_extracted_files):
+        if os.path.normpath(cached_path) == path:
+            del _extracted_files[cached_path]
+
+def _forget_extracted_files(suffix, keep):
+    """
+    Drops the cached verses of files with the given suffix that are not in keep, so files that were
+    deleted, renamed or belong to an earlier workspace are not held for the life of the server.
+
+    Args:
+        suffix (str): The file extension whose cache entries to prune.
+        keep (set): The paths to keep cached.
+    """
+    for cached_path in list(_extracted_files):
+        if cached_path.endswith(suffix) and cached_path not in keep:
+            del _extracted_files[cached_path]
+
 def extract_codex_chunks(path: str):
     """
     Extracts codex chunks from files within a directory, specified by the path.
@@ -416,10 +499,40 @@ def extract_codex_chunks(path: str):
     """
     data = []
     files = find_all(path, ".codex")
-    for file in files:
-        data.extend(extract_from_file(file))
+    _forget_extracted_files(".codex", set(files))
+    # Read the files side by side so waiting on one file's I/O overlaps parsing the others; map keeps their order
+    with concurrent.futures.ThreadPoolExecutor(max_workers=EXTRACT_WORKERS) as executor:
+        for verses in executor.map(extract_from_file, files):
+            data.extend(verses)
     return data
 
+def split_bible_verses(content):
+    """
+    Splits the content of a bible file into its references and their text.
+
+    Each verse's text ends at the whitespace before the next reference, or at the end of the content.
+    This finds each boundary with a single forward search, instead of a lazy match that retries a
+    lookahead after every character.
+
+    Args:
+        content (str): The content of the bible file.
+
+    Returns:
+        list: A list of (reference, text) tuples.
+    """
+    verses = []
+    # Like a regex $, the text stops before a final newline
+    end_of_content = len(content) - 1 if content.endswith('\n') else len(content)
+    position = 0
+    while True:
+        start = BIBLE_VERSE_START_PATTERN.search(content, position)
+        if start is None:
+            break
+        end = BIBLE_VERSE_END_PATTERN.search(content, start.end(), end_of_content)
+        position = end.start() if end else end_of_content
+        verses.append((start.group(1), content[start.end():position]))
+    return verses
+
 def extract_from_bible_file(path):
     """
     Extracts verses from a bible file at the given path.
@@ -430,13 +543,21 @@ def extract_from_bible_file(path):
     Returns:
         list: A list of verse data extracted from the bible file.
     """
+    # Only one bible is used at a time, so forget any other the workspace used before
+    _forget_extracted_files(".bible", {path})
+    return _cached_extract(path, _extract_bible_verses)
+
+def _extract_bible_verses(path):
+    """
+    Reads and splits the verses of a bible file, without caching.
+    """
     verses = []
 
     with open(path, "r", encoding="utf-8") as file:
         content = file.read()
 
         # Find all the references and their corresponding text
-        matches = re.findall(r'(\w+\s+\d+:\d+)\s+(.*?)(?=\s+\w+\s+\d+:\d+|$)', content, re.DOTALL)
+        matches = split_bible_verses(content)
 
         for match in matches:
             ref, text = match
@@ -1,6 +1,10 @@
 import re
 from typing import List
 from lsprotocol.types import Diagnostic, DocumentDiagnosticParams, Position, Range, DiagnosticSeverity
+from utils import documents
+
+# Identifies verse references, capturing them so split() keeps them
+VERSE_PATTERN = re.compile(r'([A-Z]{3} \d{1,3}:\d{1,3})')
 
 def lad_diagnostic(lspw, params: DocumentDiagnosticParams) -> List[Diagnostic]:
     """
@@ -19,16 +23,14 @@ def lad_diagnostic(lspw, params: DocumentDiagnosticParams) -> List[Diagnostic]:
     diagnostics: List[Diagnostic] = []
     document_uri = params.text_document.uri
     # Check if the document is of a type that should be analyzed
-    if ".codex" in document_uri or ".scripture" in document_uri:
+    if documents.is_scripture_uri(document_uri):
         document = lspw.server.workspace.get_document(document_uri)
         content = document.source
 
-        # Compile a regex pattern to identify verse references
-        verse_pattern = re.compile(r'([A-Z]{3} \d{1,3}:\d{1,3})')
         lines = content.split('\n')
 
         for line_num, line in enumerate(lines):
-            verses = verse_pattern.split(line)
+            verses = VERSE_PATTERN.split(line)
             for i in range(1, len(verses), 2):
                 vref = verses[i]
                 verse = verses[i + 1].strip()
@@ -38,7 +40,7 @@ def lad_diagnostic(lspw, params: DocumentDiagnosticParams) -> List[Diagnostic]:
                     verse_start = Position(line=line_num, character=line.find(verse))
                     verse_end = Position(line=line_num, character=line.find(verse) + len(verse))
                     # Retrieve the LAD score for the verse
-                    score = int(lspw.socket_router.database.get_lad(verse, vref, 5))
+                    score = int(lspw.socket_router.verse_lad(verse, vref))
                     # Generate a diagnostic if the score is below the threshold
                     if score is not None and score < 60:
                         range_ = Range(start=verse_start, end=verse_end)
@@ -2,6 +2,7 @@ import wildebeest.wb_analysis as analyze
 from lsprotocol.types import Diagnostic, DiagnosticOptions, DocumentDiagnosticParams, Position, Range, DiagnosticSeverity
 from typing import List
 import time
+from utils import documents
 
 last_call_time = 0
 last_diagnostics: List[Diagnostic] = []
@@ -30,8 +31,9 @@ def wb_line_diagnostic(lspw, params: DocumentDiagnosticParams):
 
     diagnostics = []
     document_uri = params.text_document.uri
-    if ".codex" in document_uri or ".scripture" in document_uri:
-        document = lspw.server.workspace.get_document(document_uri)
+    if not documents.is_scripture_uri(document_uri):
+        return diagnostics
+    document = lspw.server.workspace.get_document(document_uri)
     
     lines = document.lines
     for line_num, line in enumerate(lines):
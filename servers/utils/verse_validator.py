@@ -8,6 +8,8 @@ from utils import verses as vs
 
 verses = vs.VERSES
 
+REFERENCE_PATTERN = re.compile(r'(\d*[A-Z]+) (\d+):(\d+)')
+
 
 class VrefMessages(Enum):
     VERSE_SHOULD_COME_BEFORE = "The verse {verse} should come before {next}"
@@ -32,7 +34,7 @@ class ServableVrefs:
         last_verse_match = None
 
         for i, line in enumerate(lines):
-            matches = re.finditer(r'(\d*[A-Z]+) (\d+):(\d+)', line)
+            matches = REFERENCE_PATTERN.finditer(line)
             for match in matches:
                 book, chapter, verse = match.groups()
                 if verse != "1" and last_verse is None: